@@ -1,36 +1,180 @@
 import os
-import json
+import orjson
+from collections import OrderedDict
 from typing import List, Dict, Optional
-from openai import OpenAI
+import httpx
+import numpy as np
+from openai import AsyncOpenAI
+from rapidfuzz import fuzz, process, utils
 import logging
 from dotenv import load_dotenv
 
+from semantic_cache import SemanticCache
+
 # Load environment variables from .env file
 load_dotenv()
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Number of streamed chunks between progress log messages
+STREAM_PROGRESS_INTERVAL = 200
+
+# Maximum number of texts sent in one embeddings request
+EMBEDDING_BATCH_SIZE = 1000
+
+# Maximum number of topics remembered as similar to an existing topic
+SIMILAR_TOPICS_CACHE_SIZE = 4096
+
+# Fuzzy token-set scores (0-100) above which a topic is similar, and below which it
+# is unique, without asking the LLM; scores in between still go to the LLM
+FUZZY_SIMILAR_SCORE = 85
+FUZZY_UNIQUE_SCORE = 40
+
+# Prompt templates. The constant instructions come first and only a short dynamic
+# tail is appended per call, so repeated calls share a cacheable prompt prefix.
+_IDEAS_SYSTEM = "You are an expert programming educator who creates engaging technical content ideas."
+
+_IDEAS_TMPL = """Generate unique and interesting programming topics for educational content.
+
+For each topic, provide:
+1. A concise topic title (3-8 words)
+2. A brief description (1-2 sentences)
+
+Return the response as a JSON array with this exact structure:
+[
+{"topic": "Topic Title", "description": "Brief description of the topic"},
+...
+]
+
+Make the topics diverse, covering different skill levels (beginner to advanced) and different areas within the focus area.
+Focus on practical, actionable topics that would make good tutorial or educational content."""
+
+_CONTENT_SYSTEM = "You are an expert programming educator and technical writer who creates clear, comprehensive, and engaging educational content."
+
+_CONTENT_TMPL = """Write a comprehensive, educational article about the programming topic given at the end.
+
+Requirements:
+- Include practical examples and code snippets where appropriate
+- Structure the content with clear sections
+- Make it engaging and educational for developers
+- Include best practices and common pitfalls
+- Use markdown formatting for better readability
+
+Provide the response as JSON with this structure:
+{
+"title": "An engaging title for the article",
+"content": "The full article content in markdown format"
+}"""
+
+_SIMILARITY_SYSTEM = "You are an expert at identifying duplicate or overlapping content topics."
+
+_SIMILARITY_TMPL = """Determine for each of the new topics listed below whether it is substantially similar to any of the existing topics.
+Consider them similar if they would result in overlapping or redundant content.
+Also treat a new topic as similar if it overlaps with an earlier new topic in the list.
+
+Respond with a JSON object containing one result per new topic, using the numbers of the new topics as the index:
+{
+"results": [
+    {"index": 0, "is_similar": true or false, "match": "The topic it overlaps with, copied exactly, or null", "reason": "Brief explanation of your decision"},
+    ...
+]
+}"""
+
+
+def normalize_topic(topic: str) -> str:
+    """Normalize a topic for case- and whitespace-insensitive comparison"""
+    return " ".join(topic.lower().split())
+
 
 class ContentGenerator:
     """OpenAI API wrapper for generating programming content"""
 
-    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-mini"):
+    def __init__(self, api_key: Optional[str] = None, model: str = "gpt-4o-mini",
+                 cache: Optional[SemanticCache] = None,
+                 embedding_model: str = "text-embedding-3-small"):
         """
         Initialize the content generator
 
         Args:
             api_key: OpenAI API key (defaults to OPENAI_API_KEY env var)
             model: Model to use for generation (default: gpt-4o-mini for cost efficiency)
+            cache: Optional semantic cache consulted before generating content
+            embedding_model: Model used to embed cache keys
         """
         self.api_key = api_key or os.getenv("OPENAI_API_KEY")
         if not self.api_key:
             raise ValueError("OpenAI API key must be provided or set in OPENAI_API_KEY environment variable")
 
-        self.client = OpenAI(api_key=self.api_key)
+        # Shared connection pool so requests reuse keep-alive HTTP/2 connections
+        self._http = httpx.AsyncClient(
+            http2=True,
+            limits=httpx.Limits(max_keepalive_connections=32, max_connections=64),
+            timeout=60
+        )
+        self.client = AsyncOpenAI(api_key=self.api_key, http_client=self._http)
         self.model = model
+        self.cache = cache
+        self.embedding_model = embedding_model
+
+        # LRU of normalized topics already judged similar to an existing topic;
+        # existing topics only grow, so such a verdict stays valid across cycles.
+        # Verdicts against other new topics are not remembered, since those may
+        # never be stored.
+        self._similar_topics: "OrderedDict[str, None]" = OrderedDict()
+
+    async def close(self):
+        """Close the underlying HTTP connection pool"""
+        await self.client.close()
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed a batch of texts, using one OpenAI call per EMBEDDING_BATCH_SIZE texts
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            float32 matrix with one row per text
+        """
+        embeddings = []
+        for start in range(0, len(texts), EMBEDDING_BATCH_SIZE):
+            response = await self.client.embeddings.create(
+                model=self.embedding_model,
+                input=texts[start:start + EMBEDDING_BATCH_SIZE]
+            )
+            embeddings.extend(item.embedding for item in response.data)
+        return np.array(embeddings, dtype=np.float32)
 
-    def generate_ideas(self, count: int = 10, category: str = "programming") -> List[Dict[str, str]]:
+    async def _stream_completion(self, messages: List[Dict[str, str]], temperature: float) -> str:
+        """
+        Run a streamed JSON chat completion and assemble the response text
+
+        Args:
+            messages: Chat messages to send
+            temperature: Sampling temperature
+
+        Returns:
+            The full response content
+        """
+        stream = await self.client.chat.completions.create(
+            model=self.model,
+            messages=messages,
+            temperature=temperature,
+            response_format={"type": "json_object"},
+            stream=True
+        )
+
+        buf = []
+        async for chunk in stream:
+            if chunk.choices:
+                buf.append(chunk.choices[0].delta.content or "")
+                if len(buf) % STREAM_PROGRESS_INTERVAL == 0 and logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Received %s chunks", len(buf))
+
+        return "".join(buf)
+
+    async def generate_ideas(self, count: int = 10, category: str = "programming") -> List[Dict[str, str]]:
         """
         Generate a list of programming topic ideas
 
@@ -41,40 +185,26 @@ class ContentGenerator:
         Returns:
             List of dictionaries with 'topic' and 'description' keys
         """
-        logger.info(f"Generating {count} {category} topic ideas...")
-
-        prompt = f"""Generate {count} unique and interesting programming topics for educational content.
-        Focus on: {category}
+        logger.info("Generating %s %s topic ideas...", count, category)
 
-        For each topic, provide:
-        1. A concise topic title (3-8 words)
-        2. A brief description (1-2 sentences)
-
-        Return the response as a JSON array with this exact structure:
-        [
-        {{"topic": "Topic Title", "description": "Brief description of the topic"}},
-        ...
-        ]
-
-        Make the topics diverse, covering different skill levels (beginner to advanced) and different areas within {category}.
-        Focus on practical, actionable topics that would make good tutorial or educational content."""
+        prompt = "".join((
+            _IDEAS_TMPL,
+            f"\n\nNumber of topics: {count}",
+            f"\nFocus on: {category}"
+        ))
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            content = await self._stream_completion(
                 messages=[
-                    {"role": "system", "content": "You are an expert programming educator who creates engaging technical content ideas."},
+                    {"role": "system", "content": _IDEAS_SYSTEM},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.8,  # Higher temperature for more creative ideas
-                response_format={"type": "json_object"}
+                temperature=0.8  # Higher temperature for more creative ideas
             )
 
-            content = response.choices[0].message.content
-
             # Parse the JSON response
             try:
-                result = json.loads(content)
+                result = orjson.loads(content)
                 # Handle both direct array and wrapped object responses
                 if isinstance(result, dict):
                     # Try common keys
@@ -82,18 +212,19 @@ class ContentGenerator:
                 else:
                     ideas = result
 
-                logger.info(f"Successfully generated {len(ideas)} ideas")
+                logger.info("Successfully generated %s ideas", len(ideas))
                 return ideas[:count]  # Ensure we don't exceed requested count
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {e}")
-                logger.debug(f"Response content: {content}")
+            except orjson.JSONDecodeError as e:
+                logger.error("Failed to parse JSON response: %s", e)
+                if logger.isEnabledFor(logging.DEBUG):
+                    logger.debug("Response content: %s", content)
                 return []
 
         except Exception as e:
-            logger.error(f"Error generating ideas: {e}")
+            logger.error("Error generating ideas: %s", e)
             return []
 
-    def generate_content(self, topic: str, description: str = "",
+    async def generate_content(self, topic: str, description: str = "",
                         word_count: int = 800) -> Optional[Dict[str, str]]:
         """
         Generate detailed content for a programming topic
@@ -106,60 +237,60 @@ class ContentGenerator:
         Returns:
             Dictionary with 'title' and 'content' keys, or None if generation fails
         """
-        logger.info(f"Generating content for topic: {topic}")
-
-        context = f"\n\nContext: {description}" if description else ""
-
-        prompt = f"""Write a comprehensive, educational article about the following programming topic:
+        logger.info("Generating content for topic: %s", topic)
 
-        Topic: {topic}{context}
-
-        Requirements:
-        - Target length: approximately {word_count} words
-        - Include practical examples and code snippets where appropriate
-        - Structure the content with clear sections
-        - Make it engaging and educational for developers
-        - Include best practices and common pitfalls
-        - Use markdown formatting for better readability
-
-        Provide the response as JSON with this structure:
-        {{
-        "title": "An engaging title for the article",
-        "content": "The full article content in markdown format"
-        }}"""
+        cache_namespace = f"content:{self.model}:{self.embedding_model}:{word_count}"
+        cache_key = None
+        if self.cache:
+            try:
+                cache_key = (await self.embed([f"{topic}\n{description}"]))[0]
+                cached = self.cache.lookup(cache_namespace, cache_key)
+                if cached:
+                    logger.info("Using cached content: %s", cached['title'])
+                    return cached
+            except Exception as e:
+                logger.error("Error checking semantic cache: %s", e)
+
+        prompt = "".join((
+            _CONTENT_TMPL,
+            f"\n\nTarget length: approximately {word_count} words",
+            f"\n\nTopic: {topic}",
+            f"\n\nContext: {description}" if description else ""
+        ))
 
         try:
-            response = self.client.chat.completions.create(
-                model=self.model,
+            content = await self._stream_completion(
                 messages=[
-                    {"role": "system", "content": "You are an expert programming educator and technical writer who creates clear, comprehensive, and engaging educational content."},
+                    {"role": "system", "content": _CONTENT_SYSTEM},
                     {"role": "user", "content": prompt}
                 ],
-                temperature=0.7,
-                response_format={"type": "json_object"}
+                temperature=0.7
             )
 
-            content = response.choices[0].message.content
-
             try:
-                result = json.loads(content)
+                result = orjson.loads(content)
 
                 if 'title' in result and 'content' in result:
-                    logger.info(f"Successfully generated content: {result['title']}")
+                    logger.info("Successfully generated content: %s", result['title'])
+                    if cache_key is not None:
+                        try:
+                            self.cache.store(cache_namespace, cache_key, result)
+                        except Exception as e:
+                            logger.error("Error storing content in semantic cache: %s", e)
                     return result
                 else:
                     logger.error("Response missing 'title' or 'content' fields")
                     return None
 
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response: {e}")
+            except orjson.JSONDecodeError as e:
+                logger.error("Failed to parse JSON response: %s", e)
                 return None
 
         except Exception as e:
-            logger.error(f"Error generating content: {e}")
+            logger.error("Error generating content: %s", e)
             return None
 
-    def is_similar_topic(self, new_topic: str, existing_topics: List[str],
+    async def is_similar_topic(self, new_topic: str, existing_topics: List[str],
                         similarity_threshold: float = 0.8) -> bool:
         """
         Use OpenAI to determine if a new topic is too similar to existing topics
@@ -172,30 +303,79 @@ class ContentGenerator:
         Returns:
             True if the topic is similar to an existing one, False otherwise
         """
-        if not existing_topics:
-            return False
+        return (await self.filter_similar_topics([new_topic], existing_topics))[0]
 
-        logger.info(f"Checking similarity for topic: {new_topic}")
+    async def filter_similar_topics(self, new_topics: List[str], existing_topics: List[str]) -> List[bool]:
+        """
+        Use a single OpenAI call to check a batch of new topics against existing topics
 
-        prompt = f"""Determine if the following new topic is substantially similar to any of the existing topics.
-        Consider them similar if they would result in overlapping or redundant content.
+        The prompt grows with existing_topics, so callers should pre-filter it to the
+        topics nearest to the candidates (the service sends the top 20 per candidate
+        by embedding similarity).
 
-        New topic: "{new_topic}"
+        Args:
+            new_topics: The candidate topics to check
+            existing_topics: List of existing topic strings, ideally pre-filtered
 
-        Existing topics:
-        {chr(10).join(f"- {topic}" for topic in existing_topics)}
+        Returns:
+            List of booleans aligned with new_topics, True where the topic is similar
+            to an existing one
+        """
+        verdicts = [False] * len(new_topics)
+        # Without existing topics a batch is still checked for overlap among its own topics
+        if not new_topics or (not existing_topics and len(new_topics) < 2):
+            return verdicts
+
+        # Reuse earlier positive verdicts, settle clear cases with local fuzzy
+        # matching, and only ask the LLM about the remaining topics. Each topic is
+        # also matched against the new topics before it, and topics settled as unique
+        # are treated as existing in the prompt so later overlaps are still caught.
+        pending = []
+        settled_unique = []
+        for i, topic in enumerate(new_topics):
+            key = normalize_topic(topic)
+            if key in self._similar_topics:
+                self._similar_topics.move_to_end(key)
+                logger.info("Topic previously deemed similar: %s", topic)
+                verdicts[i] = True
+                continue
+
+            best = process.extractOne(
+                topic, existing_topics + new_topics[:i],
+                scorer=fuzz.token_set_ratio,
+                processor=utils.default_process
+            )
+            if best and best[1] > FUZZY_SIMILAR_SCORE:
+                logger.info("Topic deemed similar: %s (fuzzy match with %s)", topic, best[0])
+                if best[2] < len(existing_topics):
+                    self._remember_similar(topic)
+                verdicts[i] = True
+            elif not best or best[1] < FUZZY_UNIQUE_SCORE:
+                logger.info("Topic is unique: %s (no close fuzzy match)", topic)
+                settled_unique.append(topic)
+            else:
+                pending.append(i)
+
+        if not pending:
+            return verdicts
 
-        Respond with a JSON object:
-        {{
-        "is_similar": true or false,
-        "reason": "Brief explanation of your decision"
-        }}"""
+        candidates = [new_topics[i] for i in pending]
+        existing_keys = {normalize_topic(topic) for topic in existing_topics}
+        logger.info("Checking similarity for %s topics", len(candidates))
+
+        prompt = "".join((
+            _SIMILARITY_TMPL,
+            "\n\nNew topics:\n",
+            "\n".join(f"{i}. {topic}" for i, topic in enumerate(candidates)),
+            "\n\nExisting topics:\n",
+            "\n".join(f"- {topic}" for topic in existing_topics + settled_unique) or "(none)"
+        ))
 
         try:
-            response = self.client.chat.completions.create(
+            response = await self.client.chat.completions.create(
                 model=self.model,
                 messages=[
-                    {"role": "system", "content": "You are an expert at identifying duplicate or overlapping content topics."},
+                    {"role": "system", "content": _SIMILARITY_SYSTEM},
                     {"role": "user", "content": prompt}
                 ],
                 temperature=0.3,  # Lower temperature for more consistent decisions
@@ -203,19 +383,36 @@ class ContentGenerator:
             )
 
             content = response.choices[0].message.content
-            result = json.loads(content)
-
-            is_similar = result.get('is_similar', False)
-            reason = result.get('reason', '')
-
-            if is_similar:
-                logger.info(f"Topic deemed similar: {reason}")
-            else:
-                logger.info(f"Topic is unique: {reason}")
+            result = orjson.loads(content)
+
+            for item in result.get('results', []):
+                index = item.get('index')
+                if not isinstance(index, int) or not 0 <= index < len(candidates):
+                    continue
+
+                is_similar = bool(item.get('is_similar', False))
+                reason = item.get('reason', '')
+                verdicts[pending[index]] = is_similar
+
+                if is_similar:
+                    logger.info("Topic deemed similar: %s (%s)", candidates[index], reason)
+                    match = item.get('match')
+                    if isinstance(match, str) and normalize_topic(match) in existing_keys:
+                        self._remember_similar(candidates[index])
+                else:
+                    logger.info("Topic is unique: %s (%s)", candidates[index], reason)
 
-            return is_similar
+            return verdicts
 
         except Exception as e:
-            logger.error(f"Error checking similarity: {e}")
-            # On error, be conservative and assume it's not similar
-            return False
+            logger.error("Error checking similarity: %s", e)
+            # On error, be conservative and assume nothing is similar
+            return verdicts
+
+    def _remember_similar(self, topic: str):
+        """Record a topic judged similar, evicting the least recently used entry when full"""
+        key = normalize_topic(topic)
+        self._similar_topics[key] = None
+        self._similar_topics.move_to_end(key)
+        if len(self._similar_topics) > SIMILAR_TOPICS_CACHE_SIZE:
+            self._similar_topics.popitem(last=False)
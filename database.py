@@ -1,21 +1,34 @@
 import sqlite3
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import Iterator, List, Dict, Optional, Tuple, Union
 import json
 
+import zstandard as zstd
+
 
 class Database:
     """Database manager for content generation service"""
 
     def __init__(self, db_path: str = "content_generator.db"):
         self.db_path = db_path
+        # One long-lived connection in autocommit mode; writers serialize on the lock
+        self.conn = self.get_connection()
+        self._lock = threading.Lock()
+        # Article bodies (content and cached responses) are stored zstd-compressed;
+        # compression runs under the write lock
+        self._compressor = zstd.ZstdCompressor(level=3)
+        self._decompressor = zstd.ZstdDecompressor()
         self.init_database()
 
     def init_database(self):
         """Initialize database with required tables"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
+        with self.transaction() as cursor:
+            self._create_schema(cursor)
 
+    def _create_schema(self, cursor: sqlite3.Cursor):
+        """Create tables and indexes if they don't exist"""
         # Create ideas table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS ideas (
@@ -23,149 +36,197 @@ class Database:
                 topic TEXT NOT NULL UNIQUE,
                 description TEXT,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                content_generated BOOLEAN DEFAULT FALSE
+                content_generated BOOLEAN DEFAULT FALSE,
+                embedding BLOB
             )
         """)
 
+        # Add the embedding column to databases created before it existed
+        cursor.execute("PRAGMA table_info(ideas)")
+        if "embedding" not in [row["name"] for row in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE ideas ADD COLUMN embedding BLOB")
+
         # Create content table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS content (
                 id INTEGER PRIMARY KEY AUTOINCREMENT,
                 idea_id INTEGER NOT NULL,
                 title TEXT NOT NULL,
-                content TEXT NOT NULL,
+                content BLOB NOT NULL,
                 created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
                 FOREIGN KEY (idea_id) REFERENCES ideas (id)
             )
         """)
 
+        # Create semantic response cache table
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS response_cache (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                namespace TEXT NOT NULL,
+                embedding BLOB NOT NULL,
+                response BLOB NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+
         # Create index for faster lookups
         cursor.execute("""
             CREATE INDEX IF NOT EXISTS idx_ideas_topic ON ideas (topic)
         """)
 
+        # Partial index serving both the filter and the ordering of get_pending_ideas
         cursor.execute("""
-            CREATE INDEX IF NOT EXISTS idx_ideas_content_generated
-            ON ideas (content_generated)
+            CREATE INDEX IF NOT EXISTS idx_pending
+            ON ideas (created_at) WHERE content_generated = FALSE
         """)
 
-        conn.commit()
-        conn.close()
+        cursor.execute("DROP INDEX IF EXISTS idx_ideas_content_generated")
+
+    def get_connection(self) -> sqlite3.Connection:
+        """Open a new, configured database connection"""
+        conn = sqlite3.connect(self.db_path, check_same_thread=False, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        # WAL lets readers (e.g. get_stats) proceed while a cycle is writing;
+        # journal_mode persists in the file, the others are per connection
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
+        conn.execute("PRAGMA mmap_size=134217728")  # 128 MB memory-mapped I/O
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """Run a batch of statements in a single explicit transaction"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute("BEGIN")
+            try:
+                yield cursor
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
 
-    def get_connection(self):
-        """Get database connection"""
-        return sqlite3.connect(self.db_path)
+    def close(self):
+        """Close the database connection"""
+        self.conn.close()
 
-    def add_idea(self, topic: str, description: str = "") -> Optional[int]:
+    def _compress(self, content: str) -> bytes:
+        """Compress article content for storage"""
+        return self._compressor.compress(content.encode('utf-8'))
+
+    def _decompress(self, content: Union[bytes, str]) -> str:
+        """Decompress stored article content; rows written before compression are plain text"""
+        if isinstance(content, str):
+            return content
+        return self._decompressor.decompress(content).decode('utf-8')
+
+    def bulk_add_ideas(self, rows: List[Tuple[str, str, Optional[bytes]]]) -> List[Optional[int]]:
         """
-        Add a new idea to the database
-        Returns the idea ID if successful, None if duplicate
+        Insert a batch of (topic, description, embedding) ideas in a single transaction
+        Returns the idea ID for each row, or None where the topic was a duplicate
         """
-        try:
-            conn = self.get_connection()
-            cursor = conn.cursor()
-            cursor.execute(
-                "INSERT INTO ideas (topic, description) VALUES (?, ?)",
-                (topic.strip(), description.strip())
-            )
-            idea_id = cursor.lastrowid
-            conn.commit()
-            conn.close()
-            return idea_id
-        except sqlite3.IntegrityError:
-            # Duplicate topic
-            return None
+        idea_ids = []
+        with self.transaction() as cursor:
+            for topic, description, embedding in rows:
+                # The unique topic index rejects duplicates in-engine
+                cursor.execute(
+                    """
+                    INSERT INTO ideas (topic, description, embedding) VALUES (?, ?, ?)
+                    ON CONFLICT (topic) DO NOTHING
+                    RETURNING id
+                    """,
+                    (topic.strip(), description.strip(), embedding)
+                )
+                row = cursor.fetchone()
+                idea_ids.append(row[0] if row else None)
+
+        return idea_ids
 
     def idea_exists(self, topic: str) -> bool:
         """Check if an idea already exists in the database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute(
-            "SELECT COUNT(*) FROM ideas WHERE topic = ?",
+            "SELECT EXISTS (SELECT 1 FROM ideas WHERE topic = ?)",
             (topic.strip(),)
         )
-        count = cursor.fetchone()[0]
-        conn.close()
-        return count > 0
+        return bool(cursor.fetchone()[0])
 
     def get_pending_ideas(self, limit: Optional[int] = None) -> List[Dict]:
         """Get ideas that haven't had content generated yet"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
 
-        query = """
+        # LIMIT is bound so the statement text is constant; -1 means no limit
+        cursor.execute("""
             SELECT id, topic, description, created_at
             FROM ideas
             WHERE content_generated = FALSE
             ORDER BY created_at ASC
-        """
+            LIMIT ?
+        """, (limit if limit else -1,))
 
-        if limit:
-            query += f" LIMIT {limit}"
-
-        cursor.execute(query)
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [
-            {
-                "id": row[0],
-                "topic": row[1],
-                "description": row[2],
-                "created_at": row[3]
-            }
-            for row in rows
-        ]
-
-    def add_content(self, idea_id: int, title: str, content: str) -> int:
-        """Add generated content for an idea"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
-
-        # Insert content
-        cursor.execute(
-            "INSERT INTO content (idea_id, title, content) VALUES (?, ?, ?)",
-            (idea_id, title, content)
-        )
-        content_id = cursor.lastrowid
+        return [dict(row) for row in cursor.fetchall()]
 
-        # Mark idea as having content generated
-        cursor.execute(
-            "UPDATE ideas SET content_generated = TRUE WHERE id = ?",
-            (idea_id,)
-        )
+    def bulk_add_content(self, rows: List[Tuple[int, str, str]]) -> int:
+        """
+        Add a batch of (idea_id, title, content) rows in a single transaction
+        Returns the number of content pieces stored
+        """
+        with self.transaction() as cursor:
+            cursor.executemany(
+                "INSERT INTO content (idea_id, title, content) VALUES (?, ?, ?)",
+                [(idea_id, title, self._compress(content)) for idea_id, title, content in rows]
+            )
 
-        conn.commit()
-        conn.close()
-        return content_id
+            # Mark ideas as having content generated
+            cursor.executemany(
+                "UPDATE ideas SET content_generated = TRUE WHERE id = ?",
+                [(idea_id,) for idea_id, _, _ in rows]
+            )
+
+        return len(rows)
 
     def get_all_ideas(self) -> List[Dict]:
         """Get all ideas from the database"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute("""
             SELECT id, topic, description, created_at, content_generated
             FROM ideas
             ORDER BY created_at DESC
         """)
-        rows = cursor.fetchall()
-        conn.close()
-
-        return [
-            {
-                "id": row[0],
-                "topic": row[1],
-                "description": row[2],
-                "created_at": row[3],
-                "content_generated": bool(row[4])
-            }
-            for row in rows
-        ]
+        ideas = [dict(row) for row in cursor.fetchall()]
+        for idea in ideas:
+            idea["content_generated"] = bool(idea["content_generated"])
+        return ideas
+
+    def iter_topics(self) -> Iterator[str]:
+        """Stream the topic of every idea without materializing full rows"""
+        cursor = self.conn.cursor()
+        for (topic,) in cursor.execute("SELECT topic FROM ideas"):
+            yield topic
+
+    def get_topic_embeddings(self) -> List[Dict]:
+        """Get the topic and stored embedding (or None) of every idea"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, topic, embedding
+            FROM ideas
+            ORDER BY id ASC
+        """)
+        return [dict(row) for row in cursor.fetchall()]
+
+    def set_idea_embeddings(self, rows: List[Tuple[int, bytes]]):
+        """Store embeddings for a batch of (idea_id, embedding) rows"""
+        with self.transaction() as cursor:
+            cursor.executemany(
+                "UPDATE ideas SET embedding = ? WHERE id = ?",
+                [(embedding, idea_id) for idea_id, embedding in rows]
+            )
 
     def get_content_by_idea(self, idea_id: int) -> Optional[Dict]:
         """Get generated content for a specific idea"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
         cursor.execute("""
             SELECT c.id, c.title, c.content, c.created_at, i.topic
             FROM content c
@@ -173,37 +234,59 @@ class Database:
             WHERE c.idea_id = ?
         """, (idea_id,))
         row = cursor.fetchone()
-        conn.close()
 
         if row:
-            return {
-                "id": row[0],
-                "title": row[1],
-                "content": row[2],
-                "created_at": row[3],
-                "topic": row[4]
-            }
+            result = dict(row)
+            result["content"] = self._decompress(result["content"])
+            return result
         return None
 
     def get_stats(self) -> Dict:
         """Get database statistics"""
-        conn = self.get_connection()
-        cursor = conn.cursor()
+        cursor = self.conn.cursor()
 
-        cursor.execute("SELECT COUNT(*) FROM ideas")
-        total_ideas = cursor.fetchone()[0]
+        cursor.execute("""
+            SELECT
+                COUNT(*) AS total_ideas,
+                COALESCE(SUM(CASE WHEN content_generated THEN 1 ELSE 0 END), 0) AS ideas_with_content,
+                (SELECT COUNT(*) FROM content) AS total_content
+            FROM ideas
+        """)
+        row = cursor.fetchone()
 
-        cursor.execute("SELECT COUNT(*) FROM ideas WHERE content_generated = TRUE")
-        ideas_with_content = cursor.fetchone()[0]
+        return {
+            "total_ideas": row["total_ideas"],
+            "ideas_with_content": row["ideas_with_content"],
+            "pending_ideas": row["total_ideas"] - row["ideas_with_content"],
+            "total_content_pieces": row["total_content"]
+        }
 
-        cursor.execute("SELECT COUNT(*) FROM content")
-        total_content = cursor.fetchone()[0]
+    def add_cache_entry(self, namespace: str, embedding: bytes, response: str) -> int:
+        """Add a response to the semantic cache"""
+        with self._lock:
+            cursor = self.conn.cursor()
+            cursor.execute(
+                "INSERT INTO response_cache (namespace, embedding, response) VALUES (?, ?, ?)",
+                (namespace, embedding, self._compress(response))
+            )
+            return cursor.lastrowid
 
-        conn.close()
+    def get_cache_entries(self) -> List[Dict]:
+        """Get the ID, namespace and embedding of all semantic cache entries"""
+        cursor = self.conn.cursor()
+        cursor.execute("""
+            SELECT id, namespace, embedding
+            FROM response_cache
+            ORDER BY id ASC
+        """)
+        return [dict(row) for row in cursor.fetchall()]
 
-        return {
-            "total_ideas": total_ideas,
-            "ideas_with_content": ideas_with_content,
-            "pending_ideas": total_ideas - ideas_with_content,
-            "total_content_pieces": total_content
-        }
+    def get_cache_response(self, entry_id: int) -> Optional[str]:
+        """Get the stored response of a semantic cache entry"""
+        cursor = self.conn.cursor()
+        cursor.execute(
+            "SELECT response FROM response_cache WHERE id = ?",
+            (entry_id,)
+        )
+        row = cursor.fetchone()
+        return self._decompress(row["response"]) if row else None
@@ -0,0 +1,106 @@
+import orjson
+import logging
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from database import Database
+
+logger = logging.getLogger(__name__)
+
+
+class _EmbeddingIndex:
+    """Growable matrix of embeddings and their cache entry IDs for one namespace"""
+
+    def __init__(self, dim: int, capacity: int = 64):
+        self._matrix = np.empty((capacity, dim), dtype=np.float32)
+        self._norms = np.empty(capacity, dtype=np.float32)
+        self._ids = np.empty(capacity, dtype=np.int64)
+        self._size = 0
+
+    def add(self, entry_id: int, embedding: np.ndarray):
+        """Append an embedding, doubling the buffers when full"""
+        if self._size == len(self._ids):
+            capacity = 2 * len(self._ids)
+            self._matrix = np.resize(self._matrix, (capacity, self._matrix.shape[1]))
+            self._norms = np.resize(self._norms, capacity)
+            self._ids = np.resize(self._ids, capacity)
+
+        self._matrix[self._size] = embedding
+        self._norms[self._size] = np.linalg.norm(embedding)
+        self._ids[self._size] = entry_id
+        self._size += 1
+
+    def best_match(self, embedding: np.ndarray) -> Tuple[int, float]:
+        """Return the entry ID and cosine similarity of the closest embedding"""
+        n = self._size
+        scores = self._matrix[:n] @ embedding / (self._norms[:n] * np.linalg.norm(embedding))
+        best = int(np.argmax(scores))
+        return int(self._ids[best]), float(scores[best])
+
+
+class SemanticCache:
+    """Embedding-based cache of OpenAI responses stored in SQLite"""
+
+    def __init__(self, db: Database, threshold: float = 0.92):
+        """
+        Initialize the semantic cache
+
+        Args:
+            db: Database used to persist cache entries
+            threshold: Minimum cosine similarity for a cached response to be reused
+        """
+        self.db = db
+        self.threshold = threshold
+
+        # Only embeddings and entry IDs are kept in memory, so lookups are a single
+        # matrix-vector product; responses are read from SQLite on a hit
+        self._indexes: Dict[str, _EmbeddingIndex] = {}
+
+        for entry in self.db.get_cache_entries():
+            self._add_to_index(entry['namespace'], entry['id'],
+                               np.frombuffer(entry['embedding'], dtype=np.float32))
+
+    def _add_to_index(self, namespace: str, entry_id: int, embedding: np.ndarray):
+        """Add an entry's embedding to its namespace index"""
+        if namespace not in self._indexes:
+            self._indexes[namespace] = _EmbeddingIndex(len(embedding))
+        self._indexes[namespace].add(entry_id, embedding)
+
+    def lookup(self, namespace: str, embedding: np.ndarray) -> Optional[Dict]:
+        """
+        Find a cached response for a semantically similar request
+
+        Args:
+            namespace: Cache partition (e.g. request type, model and parameters)
+            embedding: Embedding of the request key
+
+        Returns:
+            The cached response if the best match exceeds the threshold, None otherwise
+        """
+        if namespace not in self._indexes:
+            return None
+
+        entry_id, score = self._indexes[namespace].best_match(embedding)
+        if score <= self.threshold:
+            return None
+
+        response = self.db.get_cache_response(entry_id)
+        if response is None:
+            return None
+
+        logger.info("Semantic cache hit (score %.3f)", score)
+        return orjson.loads(response)
+
+    def store(self, namespace: str, embedding: np.ndarray, response: Dict):
+        """
+        Add a response to the cache
+
+        Args:
+            namespace: Cache partition (e.g. request type, model and parameters)
+            embedding: Embedding of the request key
+            response: The response to cache
+        """
+        embedding = np.asarray(embedding, dtype=np.float32)
+        entry_id = self.db.add_cache_entry(namespace, embedding.tobytes(), orjson.dumps(response).decode())
+        self._add_to_index(namespace, entry_id, embedding)
@@ -7,14 +7,16 @@ stores them in SQLite, and generates detailed content pieces.
 """
 
 import time
+import asyncio
 import logging
 import argparse
-from typing import Optional
+from typing import List, Optional
 from datetime import datetime
-import schedule
+import numpy as np
 
 from database import Database
-from content_generator import ContentGenerator
+from content_generator import ContentGenerator, normalize_topic
+from semantic_cache import SemanticCache
 
 logging.basicConfig(
     level=logging.INFO,
@@ -22,6 +24,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# Topics whose embedding cosine similarity to a stored topic exceeds this are duplicates
+DUPLICATE_SIMILARITY = 0.9
+# Topics scoring between this and DUPLICATE_SIMILARITY are checked with the LLM
+AMBIGUOUS_SIMILARITY = 0.75
+# Number of nearest stored topics per candidate included in the LLM similarity prompt
+SIMILARITY_PROMPT_TOP_K = 20
+
 
 class ContentGeneratorService:
     """Main service for periodic content generation"""
@@ -32,7 +41,9 @@ class ContentGeneratorService:
                  db_path: str = "content_generator.db",
                  ideas_per_run: int = 5,
                  content_per_run: int = 3,
-                 category: str = "programming"):
+                 category: str = "programming",
+                 max_concurrency: int = 8,
+                 use_cache: bool = True):
         """
         Initialize the content generator service
 
@@ -43,14 +54,68 @@ class ContentGeneratorService:
             ideas_per_run: Number of ideas to generate per run
             content_per_run: Number of content pieces to generate per run
             category: Category of programming topics
+            max_concurrency: Maximum number of concurrent OpenAI requests
+            use_cache: Reuse stored content for semantically similar topics
         """
         self.db = Database(db_path)
-        self.generator = ContentGenerator(api_key=api_key, model=model)
+        self.generator = ContentGenerator(
+            api_key=api_key,
+            model=model,
+            cache=SemanticCache(self.db) if use_cache else None
+        )
         self.ideas_per_run = ideas_per_run
         self.content_per_run = content_per_run
         self.category = category
-
-    def generate_and_store_ideas(self):
+        self.max_concurrency = max_concurrency
+
+        # A single event loop is reused across cycles so the async OpenAI
+        # client's connections stay bound to the loop that created them
+        self._loop = asyncio.new_event_loop()
+
+        # Embeddings of all stored topics, loaded on the first idea cycle
+        self._topic_matrix: Optional[np.ndarray] = None
+        self._topic_norms: Optional[np.ndarray] = None
+        self._topic_names: List[str] = []
+
+    async def _load_topic_index(self):
+        """Load embeddings of all stored topics, embedding any that are missing"""
+        ideas = self.db.get_topic_embeddings()
+
+        missing = [idea for idea in ideas if idea['embedding'] is None]
+        if missing:
+            logger.info("Embedding %s stored topics", len(missing))
+            vectors = await self.generator.embed([idea['topic'] for idea in missing])
+            for idea, vector in zip(missing, vectors):
+                idea['embedding'] = vector.tobytes()
+            self.db.set_idea_embeddings([(idea['id'], idea['embedding']) for idea in missing])
+
+        vectors = [np.frombuffer(idea['embedding'], dtype=np.float32) for idea in ideas]
+        self._topic_matrix = np.stack(vectors) if vectors else np.empty((0, 0), dtype=np.float32)
+        self._topic_norms = np.linalg.norm(self._topic_matrix, axis=1)
+        self._topic_names = [idea['topic'] for idea in ideas]
+
+    def _topic_scores(self, vector: np.ndarray) -> np.ndarray:
+        """Cosine similarity between an embedding and every stored topic"""
+        if not len(self._topic_matrix):
+            return np.empty(0, dtype=np.float32)
+        return self._topic_matrix @ vector / (self._topic_norms * np.linalg.norm(vector))
+
+    def _nearest_topics(self, scores: np.ndarray, k: int = SIMILARITY_PROMPT_TOP_K) -> List[str]:
+        """Stored topics with the k highest scores"""
+        if len(scores) <= k:
+            return list(self._topic_names)
+        return [self._topic_names[i] for i in np.argpartition(scores, -k)[-k:]]
+
+    def _add_to_topic_index(self, topic: str, vector: np.ndarray):
+        """Add an accepted topic's embedding to the in-memory index"""
+        if len(self._topic_matrix):
+            self._topic_matrix = np.vstack([self._topic_matrix, vector])
+        else:
+            self._topic_matrix = vector[np.newaxis, :]
+        self._topic_norms = np.append(self._topic_norms, np.linalg.norm(vector))
+        self._topic_names.append(topic)
+
+    async def generate_and_store_ideas(self):
         """Generate new ideas and store them in the database"""
         logger.info("=" * 60)
         logger.info("Starting idea generation cycle")
@@ -58,7 +123,7 @@ class ContentGeneratorService:
 
         try:
             # Generate ideas using OpenAI
-            raw_ideas = self.generator.generate_ideas(
+            raw_ideas = await self.generator.generate_ideas(
                 count=self.ideas_per_run,
                 category=self.category
             )
@@ -68,13 +133,12 @@ class ContentGeneratorService:
                 return
 
             # Get existing topics for deduplication
-            existing_ideas = self.db.get_all_ideas()
-            existing_topics = [idea['topic'] for idea in existing_ideas]
+            existing_set = {normalize_topic(topic) for topic in self.db.iter_topics()}
 
             new_count = 0
             duplicate_count = 0
 
-            # Process each generated idea
+            candidates = []
             for idea in raw_ideas:
                 topic = idea.get('topic', '').strip()
                 description = idea.get('description', '').strip()
@@ -83,36 +147,116 @@ class ContentGeneratorService:
                     logger.warning("Skipping idea with empty topic")
                     continue
 
-                # Check if topic already exists (simple string match)
-                if self.db.idea_exists(topic):
-                    logger.info(f"Duplicate topic (exact match): {topic}")
+                # Check if topic already exists (case-insensitive string match)
+                if normalize_topic(topic) in existing_set:
+                    logger.info("Duplicate topic (exact match): %s", topic)
                     duplicate_count += 1
                     continue
 
-                # Check for semantic similarity using OpenAI
-                is_similar = self.generator.is_similar_topic(topic, existing_topics)
+                existing_set.add(normalize_topic(topic))
+                candidates.append((topic, description))
+
+            # Embed all candidates in one call and compare them locally against stored topics
+            try:
+                if self._topic_matrix is None:
+                    await self._load_topic_index()
+                vectors = await self.generator.embed([topic for topic, _ in candidates])
+            except Exception as e:
+                logger.error("Error embedding topics, falling back to LLM similarity check: %s", e)
+                vectors = [None] * len(candidates)
+
+            new_rows = []
+            ambiguous = []
+            # Only the stored topics nearest to an ambiguous candidate go into the LLM prompt
+            nearest_topics = set()
+            # Earlier candidates from this batch that are still in play; they only join
+            # the topic index once they have actually been stored
+            batch_topics = []
+            batch_vectors = []
+            unique_topics = set()
+            # Full topic list, loaded only if embedding fails and the LLM must see everything
+            existing_topics = None
+            for (topic, description), vector in zip(candidates, vectors):
+                if vector is None:
+                    ambiguous.append((topic, description, None))
+                    if existing_topics is None:
+                        existing_topics = list(self.db.iter_topics())
+                    nearest_topics.update(existing_topics)
+                    continue
+
+                scores = self._topic_scores(vector)
+                score = float(scores.max()) if len(scores) else 0.0
+
+                batch_scores = np.empty(0, dtype=np.float32)
+                if batch_vectors:
+                    batch_matrix = np.stack(batch_vectors)
+                    batch_scores = batch_matrix @ vector / (
+                        np.linalg.norm(batch_matrix, axis=1) * np.linalg.norm(vector)
+                    )
+                    score = max(score, float(batch_scores.max()))
+
+                if score > DUPLICATE_SIMILARITY:
+                    logger.info("Duplicate topic (similar, score %.3f): %s", score, topic)
+                    duplicate_count += 1
+                    continue
+
+                if score >= AMBIGUOUS_SIMILARITY:
+                    ambiguous.append((topic, description, vector))
+                    if len(scores):
+                        nearest_topics.update(self._nearest_topics(scores))
+                    # Earlier ambiguous candidates are already checked against this one as
+                    # earlier new topics, so only those settled as unique are added here
+                    nearest_topics.update(
+                        batch_topics[i] for i in np.flatnonzero(batch_scores >= AMBIGUOUS_SIMILARITY)
+                        if batch_topics[i] in unique_topics
+                    )
+                else:
+                    new_rows.append((topic, description, vector))
+                    unique_topics.add(topic)
+
+                batch_topics.append(topic)
+                batch_vectors.append(vector)
+
+            # Check only the ambiguous candidates with the LLM, in one OpenAI call
+            verdicts = await self.generator.filter_similar_topics(
+                [topic for topic, _, _ in ambiguous],
+                sorted(nearest_topics)
+            )
 
+            for (topic, description, vector), is_similar in zip(ambiguous, verdicts):
                 if is_similar:
-                    logger.info(f"Duplicate topic (similar): {topic}")
+                    logger.info("Duplicate topic (similar): %s", topic)
                     duplicate_count += 1
                     continue
 
-                # Add new idea to database
-                idea_id = self.db.add_idea(topic, description)
+                new_rows.append((topic, description, vector))
 
+            # The unique topic index remains the final guard against exact matches
+            idea_ids = self.db.bulk_add_ideas([
+                (topic, description, None if vector is None else vector.tobytes())
+                for topic, description, vector in new_rows
+            ])
+
+            for (topic, _, vector), idea_id in zip(new_rows, idea_ids):
                 if idea_id:
-                    logger.info(f"Added new idea #{idea_id}: {topic}")
-                    existing_topics.append(topic)  # Add to list for subsequent checks
+                    logger.info("Added new idea #%s: %s", idea_id, topic)
                     new_count += 1
+                    if vector is None:
+                        # Reload (and backfill embeddings) on the next cycle so this
+                        # topic is not invisible to local deduplication
+                        self._topic_matrix = None
+                    elif self._topic_matrix is not None:
+                        self._add_to_topic_index(topic, vector)
                 else:
+                    logger.info("Duplicate topic (exact match): %s", topic)
                     duplicate_count += 1
 
-            logger.info(f"Idea generation complete: {new_count} new, {duplicate_count} duplicates")
+            logger.info("Idea generation complete: %s new, %s duplicates", new_count, duplicate_count)
 
         except Exception as e:
-            logger.error(f"Error in idea generation: {e}", exc_info=True)
+            logger.error("Error in idea generation: %s", e, exc_info=True)
 
-    def generate_and_store_content(self):
+    async def generate_and_store_content(self):
         """Generate content for pending ideas"""
         logger.info("=" * 60)
         logger.info("Starting content generation cycle")
@@ -126,61 +270,67 @@ class ContentGeneratorService:
                 logger.info("No pending ideas to generate content for")
                 return
 
-            logger.info(f"Found {len(pending_ideas)} pending ideas")
+            logger.info("Found %s pending ideas", len(pending_ideas))
 
-            generated_count = 0
+            semaphore = asyncio.Semaphore(self.max_concurrency)
 
-            for idea in pending_ideas:
-                idea_id = idea['id']
-                topic = idea['topic']
-                description = idea.get('description', '')
+            async def generate(idea):
+                async with semaphore:
+                    logger.info("Generating content for: %s", idea['topic'])
 
-                logger.info(f"Generating content for: {topic}")
+                    # Generate content using OpenAI
+                    return await self.generator.generate_content(
+                        topic=idea['topic'],
+                        description=idea.get('description', ''),
+                        word_count=800
+                    )
 
-                # Generate content using OpenAI
-                result = self.generator.generate_content(
-                    topic=topic,
-                    description=description,
-                    word_count=800
-                )
+            results = await asyncio.gather(*(generate(idea) for idea in pending_ideas))
 
+            new_rows = []
+            for idea, result in zip(pending_ideas, results):
                 if result:
-                    title = result['title']
-                    content = result['content']
-
-                    # Store in database
-                    content_id = self.db.add_content(idea_id, title, content)
-                    logger.info(f"Stored content #{content_id}: {title}")
-                    generated_count += 1
+                    new_rows.append((idea['id'], result['title'], result['content']))
                 else:
-                    logger.error(f"Failed to generate content for: {topic}")
+                    logger.error("Failed to generate content for: %s", idea['topic'])
 
-            logger.info(f"Content generation complete: {generated_count} pieces created")
+            # Store in database
+            generated_count = self.db.bulk_add_content(new_rows)
+            for idea_id, title, _ in new_rows:
+                logger.info("Stored content for idea #%s: %s", idea_id, title)
+
+            logger.info("Content generation complete: %s pieces created", generated_count)
 
         except Exception as e:
-            logger.error(f"Error in content generation: {e}", exc_info=True)
+            logger.error("Error in content generation: %s", e, exc_info=True)
 
     def run_cycle(self):
         """Run one complete cycle of idea and content generation"""
         logger.info("\n" + "=" * 60)
-        logger.info(f"Running generation cycle at {datetime.now()}")
+        logger.info("Running generation cycle at %s", datetime.now())
         logger.info("=" * 60)
 
         # Show current stats
         stats = self.db.get_stats()
-        logger.info(f"Current stats: {stats}")
+        logger.info("Current stats: %s", stats)
 
         # Generate new ideas
-        self.generate_and_store_ideas()
+        self._loop.run_until_complete(self.generate_and_store_ideas())
 
         # Generate content for pending ideas
-        self.generate_and_store_content()
+        self._loop.run_until_complete(self.generate_and_store_content())
 
         # Show updated stats
         stats = self.db.get_stats()
-        logger.info(f"Updated stats: {stats}")
+        logger.info("Updated stats: %s", stats)
         logger.info("Cycle complete\n")
 
+    def close(self):
+        """Release resources held by the service"""
+        self._loop.run_until_complete(self.generator.close())
+        self._loop.close()
+        self.db.close()
+
     def run_once(self):
         """Run the service once and exit"""
         logger.info("Running in one-shot mode")
@@ -193,19 +343,22 @@ class ContentGeneratorService:
         Args:
             interval_minutes: How often to run the generation cycle (in minutes)
         """
-        logger.info(f"Starting periodic service (interval: {interval_minutes} minutes)")
+        logger.info("Starting periodic service (interval: %s minutes)", interval_minutes)
 
-        # Schedule the job
-        schedule.every(interval_minutes).minutes.do(self.run_cycle)
+        interval = interval_minutes * 60
+        next_run = time.monotonic()
 
-        # Run immediately on startup
-        self.run_cycle()
-
-        # Keep running
         try:
             while True:
-                schedule.run_pending()
-                time.sleep(60)  # Check every minute
+                self.run_cycle()
+
+                # Schedule against a fixed base so cycle duration doesn't accumulate as drift,
+                # skipping any runs missed while a cycle overran the interval
+                next_run += interval
+                now = time.monotonic()
+                if next_run < now:
+                    next_run += ((now - next_run) // interval + 1) * interval
+                time.sleep(next_run - now)
         except KeyboardInterrupt:
             logger.info("Service stopped by user")
 
@@ -265,6 +418,19 @@ def main():
         help='Database file path (default: content_generator.db)'
     )
 
+    parser.add_argument(
+        '--concurrency',
+        type=int,
+        default=8,
+        help='Maximum concurrent OpenAI requests (default: 8)'
+    )
+
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Disable the semantic response cache'
+    )
+
     args = parser.parse_args()
 
     # Create service instance
@@ -273,14 +439,19 @@ def main():
         db_path=args.db,
         ideas_per_run=args.ideas,
         content_per_run=args.content,
-        category=args.category
+        category=args.category,
+        max_concurrency=args.concurrency,
+        use_cache=not args.no_cache
     )
 
     # Run based on mode
-    if args.mode == 'once':
-        service.run_once()
-    else:
-        service.run_periodic(interval_minutes=args.interval)
+    try:
+        if args.mode == 'once':
+            service.run_once()
+        else:
+            service.run_periodic(interval_minutes=args.interval)
+    finally:
+        service.close()
 
 
 if __name__ == "__main__":